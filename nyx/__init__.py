@@ -452,7 +452,7 @@ class Cache(object):
   """
 
   def __init__(self):
-    self._conn_lock = threading.RLock()
+    self._conn_lock = threading.Lock()
     cache_path = nyx.data_directory('cache.sqlite')
 
     if cache_path and os.path.isfile(cache_path) and not os.access(cache_path, os.W_OK):
@@ -507,12 +507,7 @@ class Cache(object):
     :returns: **dict** of ORPorts to their fingerprint
     """
 
-    result = {}
-
-    for entry in self._query('SELECT or_port, fingerprint FROM relays WHERE address=?', address).fetchall():
-      result[entry[0]] = entry[1]
-
-    return result
+    return dict(self._query('SELECT or_port, fingerprint FROM relays WHERE address=?', address).fetchall())
 
   def relay_nickname(self, fingerprint, default = None):
     """
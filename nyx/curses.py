@@ -549,7 +549,7 @@ def demo_glyphs():
     CURSES_SCREEN.addstr(0, 0, 'Curses Glyphs:', curses.A_STANDOUT)
     x, y = 0, 2
 
-    for keycode in sorted(acs_options.keys()):
+    for keycode in sorted(acs_options):
       CURSES_SCREEN.addstr(y, x * 30, '%s (%i)' % (acs_options[keycode], keycode))
       CURSES_SCREEN.addch(y, (x * 30) + 25, keycode)
 
@@ -1103,13 +1103,16 @@ class CursorScroller(object):
       self._cursor_selection = None
       return None if page_height is None else None, 0
 
-    if self._cursor_selection in content:
-      # moves cursor location to track the selection
-      self._cursor_location = content.index(self._cursor_selection)
+    if self._cursor_location < len(content) and content[self._cursor_location] is self._cursor_selection:
+      pass  # selection is where we left it, no need to search for it
     else:
-      # select the next closest entry
-      self._cursor_location = max(0, min(self._cursor_location, len(content) - 1))
-      self._cursor_selection = content[self._cursor_location]
+      try:
+        # moves cursor location to track the selection
+        self._cursor_location = content.index(self._cursor_selection)
+      except ValueError:
+        # select the next closest entry
+        self._cursor_location = max(0, min(self._cursor_location, len(content) - 1))
+        self._cursor_selection = content[self._cursor_location]
 
     # ensure our cursor is visible
 
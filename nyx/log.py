@@ -54,6 +54,7 @@ except ImportError:
   from stem.util.lru_cache import lru_cache
 
 TOR_RUNLEVELS = ['DEBUG', 'INFO', 'NOTICE', 'WARN', 'ERR']
+TOR_RUNLEVEL_SET = frozenset(TOR_RUNLEVELS)
 NYX_RUNLEVELS = ['NYX_DEBUG', 'NYX_INFO', 'NYX_NOTICE', 'NYX_WARNING', 'NYX_ERROR']
 TIMEZONE_OFFSET = time.altzone if time.localtime()[8] else time.timezone
 GROUP_BY_DAY = True
@@ -399,7 +400,7 @@ class LogFilters(object):
     self._max_filters = max_filters
     self._selected = None
     self._past_filters = collections.OrderedDict()
-    self._lock = threading.RLock()
+    self._lock = threading.Lock()
 
     if initial_filters:
       # register these regexes as options, then blank our selection
@@ -462,6 +463,7 @@ def read_tor_log(path, read_limit = None):
 
   start_time = time.time()
   count, isdst = 0, time.localtime().tm_isdst
+  current_year = str(datetime.datetime.now().year)
 
   for line in stem.util.system.tail(path, read_limit):
     # entries look like:
@@ -475,12 +477,13 @@ def read_tor_log(path, read_limit = None):
 
     if len(line_comp) < 4:
       raise ValueError("Log located at %s has a line that doesn't match the format we expect: %s" % (path, line))
-    elif len(line_comp[3]) < 3 or line_comp[3][1:-1].upper() not in TOR_RUNLEVELS:
-      raise ValueError('Log located at %s has an unrecognized runlevel: %s' % (path, line_comp[3]))
 
     runlevel = line_comp[3][1:-1].upper()
+
+    if len(line_comp[3]) < 3 or runlevel not in TOR_RUNLEVEL_SET:
+      raise ValueError('Log located at %s has an unrecognized runlevel: %s' % (path, line_comp[3]))
+
     msg = ' '.join(line_comp[4:])
-    current_year = str(datetime.datetime.now().year)
 
     # Pretending it's the current year. We don't know the actual year (#15607)
     # and this may fail due to leap years when picking Feb 29th (#5265).
@@ -493,7 +496,7 @@ def read_tor_log(path, read_limit = None):
 
       timestamp = int(time.mktime(tuple(timestamp_comp)))  # converts local to unix time
 
-      if timestamp > time.time():
+      if timestamp > start_time:
         # log entry is from before a year boundary
         timestamp_comp[0] -= 1
         timestamp = int(time.mktime(tuple(timestamp_comp)))
@@ -9,6 +9,8 @@ import collections
 import curses
 import itertools
 import re
+import socket
+import struct
 import time
 
 import nyx
@@ -33,11 +35,20 @@ UPDATE_RATE = 5  # rate in seconds at which we refresh
 
 # cached information from our last _update() call
 
-LAST_RETRIEVED_HS_CONF = None
-LAST_RETRIEVED_CIRCUITS = None
+LAST_RETRIEVED_HS_TARGETS = set()  # (address, port) our hidden services forward to
+LAST_RETRIEVED_DIR_FINGERPRINTS = set()  # relays we have one-hop circuits to
+
+# Entries we've constructed, and when they were last referenced. The latter is
+# ordered from least to most recently referenced so expiring entries only
+# needs to look at the oldest.
 
 ENTRY_CACHE = {}
-ENTRY_CACHE_REFERENCED = {}
+ENTRY_CACHE_REFERENCED = collections.OrderedDict()
+
+# listing we last summarized in our title, and its category counts
+
+LAST_COUNTED_ENTRIES = None
+LAST_COUNT_LABEL = None
 
 # Connection Categories:
 #   Inbound      Relay connection, coming to us.
@@ -53,6 +64,10 @@ Category = enum.Enum('INBOUND', 'OUTBOUND', 'EXIT', 'HIDDEN', 'SOCKS', 'CIRCUIT'
 SortAttr = enum.Enum('CATEGORY', 'UPTIME', 'IP_ADDRESS', 'PORT', 'FINGERPRINT', 'NICKNAME', 'COUNTRY')
 LineType = enum.Enum('CONNECTION', 'CIRCUIT_HEADER', 'CIRCUIT')
 
+# position of each category in our enumeration, for sorting by category
+
+CATEGORY_ORDER = dict([(category, i) for i, category in enumerate(Category)])
+
 Line = collections.namedtuple('Line', [
   'entry',
   'line_type',
@@ -84,7 +99,7 @@ class Entry(object):
     if connection not in ENTRY_CACHE:
       ENTRY_CACHE[connection] = ConnectionEntry(connection)
 
-    ENTRY_CACHE_REFERENCED[connection] = time.time()
+    _mark_referenced(connection)
     return ENTRY_CACHE[connection]
 
   @staticmethod
@@ -92,13 +107,14 @@ class Entry(object):
     if circuit not in ENTRY_CACHE:
       ENTRY_CACHE[circuit] = CircuitEntry(circuit)
 
-    ENTRY_CACHE_REFERENCED[circuit] = time.time()
+    _mark_referenced(circuit)
     return ENTRY_CACHE[circuit]
 
   def __init__(self):
     self._lines = None
     self._type = None
     self._is_private_val = None
+    self._sort_values = {}
 
   def get_lines(self):
     """
@@ -147,27 +163,39 @@ class Entry(object):
     :returns: comparable value for sorting
     """
 
+    # Our lines are fixed once fetched, so values (like the integer form of
+    # our address) only need to be computed once rather than on every sort.
+
+    if attr not in self._sort_values:
+      self._sort_values[attr] = self._get_sort_value(attr)
+
+    return self._sort_values[attr]
+
+  def _get_sort_value(self, attr):
+    # Attributes we may lack are bucketed so entries without them order at the
+    # end, rather than after a sentinel that a real value could sort past.
+
     line = self.get_lines()[0]
-    at_end = 'z' * 20
+    at_end = (1, '')
 
     if attr == SortAttr.IP_ADDRESS:
       if self.is_private():
-        return 255 ** 4  # orders at the end
+        return at_end
       else:
-        address_int = connection.address_to_int(line.connection.remote_address)
-        return address_int * 65536 + line.connection.remote_port
+        address_int = _address_to_int(line.connection.remote_address)
+        return (0, address_int * 65536 + line.connection.remote_port)
     elif attr == SortAttr.PORT:
       return line.connection.remote_port
     elif attr == SortAttr.FINGERPRINT:
-      return line.fingerprint if line.fingerprint else at_end
+      return (0, line.fingerprint) if line.fingerprint else at_end
     elif attr == SortAttr.NICKNAME:
-      return line.nickname if line.nickname else at_end
+      return (0, line.nickname) if line.nickname else at_end
     elif attr == SortAttr.CATEGORY:
-      return Category.index_of(self.get_type())
+      return CATEGORY_ORDER[self.get_type()]
     elif attr == SortAttr.UPTIME:
       return line.connection.start_time
     elif attr == SortAttr.COUNTRY:
-      return line.locale if (line.locale and not self.is_private()) else at_end
+      return (0, line.locale) if (line.locale and not self.is_private()) else at_end
     else:
       return ''
 
@@ -185,12 +213,13 @@ class ConnectionEntry(Entry):
   def __init__(self, connection):
     super(ConnectionEntry, self).__init__()
     self._connection = connection
+    self._relay_fingerprints_val = None
 
   def _get_lines(self):
     fingerprint, nickname = None, None
 
     if self.get_type() in (Category.OUTBOUND, Category.CIRCUIT, Category.DIRECTORY, Category.EXIT):
-      fingerprint = nyx.tracker.get_consensus_tracker().get_relay_fingerprints(self._connection.remote_address).get(self._connection.remote_port)
+      fingerprint = self._relay_fingerprints().get(self._connection.remote_port)
 
       if fingerprint:
         nickname = nyx.tracker.get_consensus_tracker().get_relay_nickname(fingerprint)
@@ -210,20 +239,19 @@ class ConnectionEntry(Entry):
     elif self._connection.local_port in controller.get_ports(Listener.CONTROL, []):
       return Category.CONTROL
 
-    if LAST_RETRIEVED_HS_CONF:
-      for hs_config in LAST_RETRIEVED_HS_CONF.values():
-        if self._connection.remote_port == hs_config['HiddenServicePort']:
-          return Category.HIDDEN
+    if (self._connection.remote_address, self._connection.remote_port) in LAST_RETRIEVED_HS_TARGETS:
+      return Category.HIDDEN
+
+    fingerprint = self._relay_fingerprints().get(self._connection.remote_port)
 
-    fingerprint = nyx.tracker.get_consensus_tracker().get_relay_fingerprints(self._connection.remote_address).get(self._connection.remote_port)
-    exit_policy = controller.get_exit_policy(None)
+    if fingerprint:
+      if fingerprint in LAST_RETRIEVED_DIR_FINGERPRINTS:
+        return Category.DIRECTORY  # one-hop circuit to retrieve directory information
+    else:
+      exit_policy = controller.get_exit_policy(None)
 
-    if fingerprint and LAST_RETRIEVED_CIRCUITS:
-      for circ in LAST_RETRIEVED_CIRCUITS:
-        if circ.path and len(circ.path) == 1 and circ.path[0][0] == fingerprint and circ.status == 'BUILT':
-          return Category.DIRECTORY  # one-hop circuit to retrieve directory information
-    elif not fingerprint and exit_policy and exit_policy.can_exit_to(self._connection.remote_address, self._connection.remote_port):
-      return Category.EXIT
+      if exit_policy and exit_policy.can_exit_to(self._connection.remote_address, self._connection.remote_port):
+        return Category.EXIT
 
     return Category.OUTBOUND
 
@@ -232,7 +260,7 @@ class ConnectionEntry(Entry):
       return True
 
     if self.get_type() == Category.INBOUND:
-      return len(nyx.tracker.get_consensus_tracker().get_relay_fingerprints(self._connection.remote_address)) == 0
+      return len(self._relay_fingerprints()) == 0
     elif self.get_type() == Category.EXIT:
       # DNS connections exiting us aren't private (since they're hitting our
       # resolvers). Everything else is.
@@ -241,6 +269,20 @@ class ConnectionEntry(Entry):
 
     return False  # for everything else this isn't a concern
 
+  def _relay_fingerprints(self):
+    """
+    Relays in the consensus at our remote address. The consensus tracker
+    memoizes these, but checks if the address is our own and takes a lock to
+    do so. Our type, lines, and privacy each need this, so we keep it at hand.
+
+    :returns: **dict** of ORPorts to their fingerprint
+    """
+
+    if self._relay_fingerprints_val is None:
+      self._relay_fingerprints_val = nyx.tracker.get_consensus_tracker().get_relay_fingerprints(self._connection.remote_address)
+
+    return self._relay_fingerprints_val
+
 
 class CircuitEntry(Entry):
   def __init__(self, circuit):
@@ -325,7 +367,7 @@ class ConnectionPanel(nyx.panel.DaemonPanel):
 
     if results:
       self._sort_order = results
-      self._entries = sorted(self._entries, key = lambda entry: [entry.sort_value(attr) for attr in self._sort_order])
+      self._entries = _sort_entries(self._entries, self._sort_order)
 
   def set_paused(self, is_pause):
     if is_pause:
@@ -446,7 +488,8 @@ class ConnectionPanel(nyx.panel.DaemonPanel):
     lines = list(itertools.chain.from_iterable([entry.get_lines() for entry in entries]))
     is_showing_details = self._show_details and lines
     details_offset = DETAILS_HEIGHT + 1 if is_showing_details else 0
-    selected, scroll = self._scroller.selection(lines, subwindow.height - details_offset - 1)
+    listing_height = subwindow.height - details_offset - 1
+    selected, scroll = self._scroller.selection(lines, listing_height)
 
     if interface.is_paused():
       current_time = self._pause_time
@@ -455,7 +498,7 @@ class ConnectionPanel(nyx.panel.DaemonPanel):
     else:
       current_time = time.time()
 
-    is_scrollbar_visible = len(lines) > subwindow.height - details_offset - 1
+    is_scrollbar_visible = len(lines) > listing_height
     scroll_offset = 2 if is_scrollbar_visible else 0
 
     _draw_title(subwindow, entries, self._show_details)
@@ -471,19 +514,15 @@ class ConnectionPanel(nyx.panel.DaemonPanel):
     if is_scrollbar_visible:
       subwindow.scrollbar(1 + details_offset, scroll, len(lines))
 
-    for line_number in range(scroll, len(lines)):
-      y = line_number + details_offset + 1 - scroll
-      _draw_line(subwindow, scroll_offset, y, lines[line_number], lines[line_number] == selected, subwindow.width - scroll_offset, current_time)
-
-      if y >= subwindow.height:
-        break
+    for y, line in enumerate(lines[scroll:scroll + listing_height], details_offset + 1):
+      _draw_line(subwindow, scroll_offset, y, line, line == selected, subwindow.width - scroll_offset, current_time)
 
   def _update(self):
     """
     Fetches the newest resolved connections.
     """
 
-    global LAST_RETRIEVED_CIRCUITS, LAST_RETRIEVED_HS_CONF
+    global LAST_RETRIEVED_HS_TARGETS, LAST_RETRIEVED_DIR_FINGERPRINTS
 
     conn_resolver = nyx.tracker.get_connection_tracker()
     resolution_count = conn_resolver.run_counter()
@@ -505,24 +544,36 @@ class ConnectionPanel(nyx.panel.DaemonPanel):
         else:
           time.sleep(nyx.PAUSE_TIME)
 
-    controller = tor_controller()
-    LAST_RETRIEVED_CIRCUITS = controller.get_circuits([])
-    LAST_RETRIEVED_HS_CONF = controller.get_hidden_service_conf({})
-
     if not conn_resolver.is_alive():
       return  # if we're not fetching connections then this is a no-op
     elif resolution_count == self._last_resource_fetch:
       return  # no new connections to process
 
+    # only worth querying tor for these once we know we have new connections
+
+    controller = tor_controller()
+    hs_targets, dir_fingerprints = set(), set()
+
+    for hs_config in controller.get_hidden_service_conf({}).values():
+      for _, target_address, target_port in hs_config['HiddenServicePort']:
+        hs_targets.add((target_address, target_port))
+
     new_entries = [Entry.from_connection(conn) for conn in conn_resolver.get_value()]
 
-    for circ in LAST_RETRIEVED_CIRCUITS:
+    for circ in controller.get_circuits([]):
       # Skips established single-hop circuits (these are for directory
       # fetches, not client circuits)
 
-      if not (circ.status == 'BUILT' and len(circ.path) == 1):
+      if circ.status == 'BUILT' and len(circ.path) == 1:
+        dir_fingerprints.add(circ.path[0][0])
+      else:
         new_entries.append(Entry.from_circuit(circ))
 
+    # swapped in whole since entries read these sets when determining their type
+
+    LAST_RETRIEVED_HS_TARGETS = hs_targets
+    LAST_RETRIEVED_DIR_FINGERPRINTS = dir_fingerprints
+
     # update stats for client and exit connections
 
     for entry in new_entries:
@@ -542,7 +593,28 @@ class ConnectionPanel(nyx.panel.DaemonPanel):
 
         self._counted_connections.add(line.connection.remote_address)
 
-    self._entries = sorted(new_entries, key = lambda entry: [entry.sort_value(attr) for attr in self._sort_order])
+    # Most entries persist between updates. Timsort merges presorted runs in
+    # linear time, so leading with the entries we already had (in their prior
+    # order) means we only pay to place new arrivals.
+
+    entries, sort_order = self._entries, self._sort_order
+    current_entries = set(new_entries)
+    retained_entries = [entry for entry in entries if entry in current_entries]
+    retained_set = set(retained_entries)
+    added_entries = [entry for entry in new_entries if entry not in retained_set]
+
+    # Sort values are memoized, so only new arrivals can change our order.
+    # Dropping entries leaves the rest sorted, and if nothing changed we keep
+    # our listing as-is. That is, unless the user picked a new ordering while
+    # we were working, in which case our snapshot's order is stale.
+
+    if self._sort_order != sort_order:
+      self._entries = _sort_entries(retained_entries + added_entries, self._sort_order)
+    elif added_entries:
+      self._entries = _sort_entries(retained_entries + added_entries, sort_order)
+    elif len(retained_entries) != len(entries):
+      self._entries = retained_entries
+
     self._last_resource_fetch = resolution_count
 
     if CONFIG['resolve_processes']:
@@ -561,18 +633,59 @@ class ConnectionPanel(nyx.panel.DaemonPanel):
     # clear cache of anything that hasn't been referenced in the last five minutes
 
     now = time.time()
-    to_clear = [k for k, v in ENTRY_CACHE_REFERENCED.items() if (now - v) >= 300]
 
-    for entry in to_clear:
-      for cache in (ENTRY_CACHE, ENTRY_CACHE_REFERENCED):
-        try:
-          del cache[entry]
-        except KeyError:
-          pass
+    while ENTRY_CACHE_REFERENCED:
+      oldest = next(iter(ENTRY_CACHE_REFERENCED))
+
+      if (now - ENTRY_CACHE_REFERENCED[oldest]) < 300:
+        break
+
+      del ENTRY_CACHE_REFERENCED[oldest]
+      ENTRY_CACHE.pop(oldest, None)
 
     self.redraw()
 
 
+def _mark_referenced(key):
+  """
+  Notes that a cached entry was just used, moving it to the end of our
+  ENTRY_CACHE_REFERENCED ordering.
+  """
+
+  ENTRY_CACHE_REFERENCED.pop(key, None)
+  ENTRY_CACHE_REFERENCED[key] = time.time()
+
+
+def _address_to_int(address):
+  """
+  Integer representation of an address. Stem's address_to_int() goes through
+  a binary string, so we have the socket module pack IPv4 addresses (our vast
+  majority) instead.
+
+  :param str address: address to convert
+
+  :returns: **int** for the address
+  """
+
+  if ':' in address:
+    return connection.address_to_int(address)  # ipv6 address
+  else:
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def _sort_entries(entries, sort_order):
+  """
+  Orders entries by the given attributes. Each entry's sort values are
+  gathered once into a tuple so comparisons don't call back into python.
+  """
+
+  if len(sort_order) == 1:
+    attr = sort_order[0]
+    return sorted(entries, key = lambda entry: entry.sort_value(attr))
+
+  return sorted(entries, key = lambda entry: tuple([entry.sort_value(attr) for attr in sort_order]))
+
+
 def _draw_title(subwindow, entries, showing_details):
   """
   Panel title with the number of connections we presently have.
@@ -583,9 +696,26 @@ def _draw_title(subwindow, entries, showing_details):
   elif not entries:
     subwindow.addstr(0, 0, 'Connections:', HIGHLIGHT)
   else:
+    subwindow.addstr(0, 0, 'Connections (%s):' % _count_label(entries), HIGHLIGHT)
+
+
+def _count_label(entries):
+  """
+  Provides the number of entries we have in each category. Our listing is
+  replaced rather than modified when it changes, so this is only recomputed
+  when given a different list than last time.
+  """
+
+  global LAST_COUNTED_ENTRIES, LAST_COUNT_LABEL
+
+  if entries is not LAST_COUNTED_ENTRIES:
     counts = collections.Counter([entry.get_type() for entry in entries])
     count_labels = ['%i %s' % (counts[category], category.lower()) for category in Category if counts[category]]
-    subwindow.addstr(0, 0, 'Connections (%s):' % ', '.join(count_labels), HIGHLIGHT)
+
+    LAST_COUNTED_ENTRIES = entries
+    LAST_COUNT_LABEL = ', '.join(count_labels)
+
+  return LAST_COUNT_LABEL
 
 
 def _draw_line(subwindow, x, y, line, is_selected, width, current_time):
@@ -611,7 +741,11 @@ def _draw_line(subwindow, x, y, line, is_selected, width, current_time):
 
 
 def _draw_address_column(subwindow, x, y, line, attr):
-  src = tor_controller().get_info('address', line.connection.local_address)
+  controller = tor_controller()
+  entry_type, is_private = line.entry.get_type(), line.entry.is_private()
+  is_locale_available = controller.get_info('ip-to-country/ipv4-available', '0') == '1'
+
+  src = controller.get_info('address', line.connection.local_address)
 
   if line.line_type == LineType.CONNECTION:
     src = '%s:%s' % (src, line.connection.local_port)
@@ -619,21 +753,21 @@ def _draw_address_column(subwindow, x, y, line, attr):
   if line.line_type == LineType.CIRCUIT_HEADER and line.circuit.status != 'BUILT':
     dst = 'Building...'
   else:
-    dst = '<scrubbed>' if line.entry.is_private() else line.connection.remote_address
+    dst = '<scrubbed>' if is_private else line.connection.remote_address
     dst += ':%s' % line.connection.remote_port
 
-    if line.entry.get_type() == Category.EXIT:
+    if entry_type == Category.EXIT:
       purpose = connection.port_usage(line.connection.remote_port)
 
       if purpose:
         dst += ' (%s)' % str_tools.crop(purpose, 26 - len(dst) - 3)
-    elif tor_controller().get_info('ip-to-country/ipv4-available', '0') == '1' and not line.entry.is_private():
+    elif is_locale_available and not is_private:
       dst += ' (%s)' % (line.locale if line.locale else '??')
 
   src = '%-21s' % src
-  dst = '%-21s' % dst if tor_controller().get_info('ip-to-country/ipv4-available', '0') != '1' else '%-26s' % dst
+  dst = '%-26s' % dst if is_locale_available else '%-21s' % dst
 
-  if line.entry.get_type() in (Category.INBOUND, Category.SOCKS, Category.CONTROL):
+  if entry_type in (Category.INBOUND, Category.SOCKS, Category.CONTROL):
     dst, src = src, dst
 
   if line.line_type == LineType.CIRCUIT:
@@ -652,9 +786,10 @@ def _draw_details(subwindow, selected):
   if selected.line_type == LineType.CIRCUIT_HEADER and selected.circuit.status != 'BUILT':
     subwindow.addstr(2, 1, 'Building Circuit...', *attr)
   else:
-    address = '<scrubbed>' if selected.entry.is_private() else selected.connection.remote_address
+    is_private = selected.entry.is_private()
+    address = '<scrubbed>' if is_private else selected.connection.remote_address
     subwindow.addstr(2, 1, 'address: %s:%s' % (address, selected.connection.remote_port), *attr)
-    subwindow.addstr(2, 2, 'locale: %s' % (selected.locale if selected.locale and not selected.entry.is_private() else '??'), *attr)
+    subwindow.addstr(2, 2, 'locale: %s' % (selected.locale if selected.locale and not is_private else '??'), *attr)
 
     matches = nyx.tracker.get_consensus_tracker().get_relay_fingerprints(selected.connection.remote_address)
 
@@ -685,7 +820,7 @@ def _draw_details(subwindow, selected):
     else:
       subwindow.addstr(2, 3, 'Multiple matches, possible fingerprints are:', *attr)
 
-      for i, port in enumerate(sorted(matches.keys())):
+      for i, port in enumerate(sorted(matches)):
         is_last_line, remaining_relays = i == 3, len(matches) - i
 
         if not is_last_line or remaining_relays == 1:
@@ -700,11 +835,13 @@ def _draw_details(subwindow, selected):
 
 
 def _draw_line_details(subwindow, x, y, line, width, attr):
+  entry_type = line.entry.get_type()
+
   if line.line_type == LineType.CIRCUIT_HEADER:
     comp = ['Purpose: %s' % line.circuit.purpose.capitalize(), ', Circuit ID: %s' % line.circuit.id]
-  elif line.entry.get_type() in (Category.SOCKS, Category.HIDDEN, Category.CONTROL):
+  elif entry_type in (Category.SOCKS, Category.HIDDEN, Category.CONTROL):
     try:
-      port = line.connection.local_port if line.entry.get_type() == Category.HIDDEN else line.connection.remote_port
+      port = line.connection.local_port if entry_type == Category.HIDDEN else line.connection.remote_port
       process = nyx.tracker.get_port_usage_tracker().fetch(port)
       comp = ['%s (%s)' % (process.name, process.pid) if process.pid else process.name]
     except nyx.tracker.UnresolvedResult:
@@ -320,14 +320,18 @@ class BandwidthStats(GraphCategory):
         if is_successful:
           log.info('Bandwidth graph has information for the last %s' % str_tools.time_label(len(bw_entries.split()), is_long = True))
 
-      read_total = controller.get_info('traffic/read', None)
-      write_total = controller.get_info('traffic/written', None)
       start_time = system.start_time(controller.get_pid(None))
 
-      if read_total and write_total and start_time:
-        self.primary.total = int(read_total)
-        self.secondary.total = int(write_total)
-        self.start_time = start_time
+      if start_time:
+        # both totals in a single GETINFO rather than a round trip for each
+
+        traffic = controller.get_info(['traffic/read', 'traffic/written'], {})
+        read_total, write_total = traffic.get('traffic/read'), traffic.get('traffic/written')
+
+        if read_total and write_total:
+          self.primary.total = int(read_total)
+          self.secondary.total = int(write_total)
+          self.start_time = start_time
 
   def stat_type(self):
     return GraphStat.BANDWIDTH
@@ -428,7 +432,7 @@ class GraphPanel(nyx.panel.Panel):
       GraphStat.SYSTEM_RESOURCES: ResourceStats(),
     }
 
-    self._stats_lock = threading.RLock()
+    self._stats_lock = threading.Lock()
     self._stats_paused = None
 
     if CONFIG['show_connections']:
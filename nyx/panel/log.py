@@ -397,7 +397,7 @@ def _draw_entries(subwindow, x, y, event_log, show_duplicates):
   for entry in event_log:
     day_to_entries.setdefault(entry.day_count(), []).append(entry)
 
-  for day in sorted(day_to_entries.keys(), reverse = True):
+  for day in sorted(day_to_entries, reverse = True):
     if day == today:
       for entry in day_to_entries[day]:
         y = _draw_entry(subwindow, x + 1, y, subwindow.width, entry, show_duplicates)
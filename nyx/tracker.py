@@ -81,6 +81,11 @@ RESOURCE_TRACKER = None
 PORT_USAGE_TRACKER = None
 CONSENSUS_TRACKER = None
 
+# maximum number of addresses we remember the relays of between consensus
+# updates
+
+RELAY_CACHE_SIZE = 5000
+
 CustomResolver = enum.Enum(
   ('INFERENCE', 'by inference'),
 )
@@ -311,8 +316,8 @@ def _process_for_ports(local_ports, remote_ports):
     if ':' not in local or ':' not in remote:
       raise ValueError("'%s' is expected to be 'address:port' entries" % port_map)
 
-    local_port = local.split(':', 1)[1]
-    remote_port = remote.split(':', 1)[1]
+    local_port = local.rpartition(':')[2]
+    remote_port = remote.rpartition(':')[2]
 
     if not connection.is_valid_port(local_port):
       raise ValueError("'%s' isn't a valid port" % local_port)
@@ -351,7 +356,7 @@ def _process_for_ports(local_ports, remote_ports):
       except ValueError as exc:
         raise IOError('unrecognized output from lsof (%s): %s' % (exc, line))
 
-    for unknown_port in set(local_ports).union(remote_ports).difference(results.keys()):
+    for unknown_port in set(local_ports).union(remote_ports).difference(results):
       results[unknown_port] = None
 
     return results
@@ -369,7 +374,7 @@ class Daemon(threading.Thread):
     super(Daemon, self).__init__()
     self.setDaemon(True)
 
-    self._process_lock = threading.RLock()
+    self._process_lock = threading.Lock()
     self._process_pid = None
     self._process_name = None
 
@@ -394,17 +399,22 @@ class Daemon(threading.Thread):
 
         continue  # done waiting, try again
 
+      # Only holding our lock while reading the process we're tracking. Tasks
+      # can take a while, and tor's status listener shouldn't block on them.
+
       with self._process_lock:
-        is_successful = False
+        process_pid, process_name = self._process_pid, self._process_name
 
-        if self._process_pid is not None:
-          try:
-            is_successful = self._task(self._process_pid, self._process_name)
-          except Exception as exc:
-            stem.util.log.notice('BUG: Unexpected exception from %s: %s' % (type(self).__name__, exc))
+      is_successful = False
 
-        if is_successful:
-          self._run_counter += 1
+      if process_pid is not None:
+        try:
+          is_successful = self._task(process_pid, process_name)
+        except Exception as exc:
+          stem.util.log.notice('BUG: Unexpected exception from %s: %s' % (type(self).__name__, exc))
+
+      if is_successful:
+        self._run_counter += 1
 
       self._last_ran = time.time()
 
@@ -513,7 +523,17 @@ class ConnectionTracker(Daemon):
     self._resolvers = [CustomResolver.INFERENCE] if stem.util.proc.is_available() else []
 
     if tor_controller().get_conf('DisableDebuggerAttachment', None) == '0':
-      self._resolvers = self._resolvers + connection.system_resolvers()
+      system_resolvers = connection.system_resolvers()
+
+      # When we can read tor's file descriptors proc gives us its exact
+      # sockets without forking netstat or friends, so prefer that over both
+      # inference and other system resolvers. That's usually only the case
+      # when we run as tor's user, otherwise proc would just fail.
+
+      if connection.Resolver.PROC in system_resolvers and self._process_pid and os.access('/proc/%s/fd' % self._process_pid, os.R_OK):
+        self._resolvers = [connection.Resolver.PROC] + self._resolvers
+
+      self._resolvers = self._resolvers + [r for r in system_resolvers if r not in self._resolvers]
     elif not self._resolvers:
       stem.util.log.notice("Tor connection information is unavailable. This is fine, but if you would like to have it please see https://nyx.torproject.org/#no_connections")
 
@@ -545,10 +565,10 @@ class ConnectionTracker(Daemon):
         relay_ports.update(controller.get_ports(stem.control.Listener.CONTROL, []))
 
         for conn in proc.connections(user = controller.get_user(None)):
-          if conn.remote_port in consensus_tracker.get_relay_fingerprints(conn.remote_address):
-            connections.append(conn)  # outbound to another relay
-          elif conn.local_port in relay_ports:
+          if conn.local_port in relay_ports:
             connections.append(conn)
+          elif conn.remote_port in consensus_tracker.get_relay_fingerprints(conn.remote_address):
+            connections.append(conn)  # outbound to another relay
       else:
         connections = connection.get_connections(resolver, process_pid = process_pid, process_name = process_name)
 
@@ -765,8 +785,11 @@ class PortUsageTracker(Daemon):
     return self._processes_for_ports
 
   def _task(self, process_pid, process_name):
-    local_ports = self._last_requested_local_ports
-    remote_ports = self._last_requested_remote_ports
+    # Sets so checking our cache against the requested ports is a hash lookup
+    # rather than a list scan. This also leaves our caller's lists unmodified.
+
+    local_ports = set(self._last_requested_local_ports)
+    remote_ports = set(self._last_requested_remote_ports)
 
     if not local_ports and not remote_ports:
       return True
@@ -785,7 +808,7 @@ class PortUsageTracker(Daemon):
 
     try:
       if local_ports or remote_ports:
-        result.update(_process_for_ports(local_ports, remote_ports))
+        result.update(_process_for_ports(list(local_ports), list(remote_ports)))
 
       self._processes_for_ports = result
       self._failure_count = 0
@@ -811,6 +834,12 @@ class ConsensusTracker(object):
     self._my_router_status_entry = None
     self._my_router_status_entry_time = 0
 
+    # Relays we've looked up by address. The cache only changes when we get a
+    # new consensus, so these are valid until our next _update().
+
+    self._relays_for_address = {}
+    self._relays_for_address_lock = threading.Lock()
+
     # Stem's get_network_statuses() is slow, and overkill for what we need
     # here. Just parsing the raw GETINFO response to cut startup time down.
     #
@@ -835,21 +864,30 @@ class ConsensusTracker(object):
     start_time = time.time()
     our_fingerprint = tor_controller().get_info('fingerprint', None)
 
+    # bound to locals since they're used for every relay in the consensus
+
+    base64_to_hex = stem.descriptor.router_status_entry._base64_to_hex
+
     with nyx.cache().write() as writer:
+      record_relay = writer.record_relay
+
       for line in consensus_content.splitlines():
         if line.startswith('r '):
           r_comp = line.split(' ')
 
           address = r_comp[6]
           or_port = int(r_comp[7])
-          fingerprint = stem.descriptor.router_status_entry._base64_to_hex(r_comp[2])
+          fingerprint = base64_to_hex(r_comp[2])
           nickname = r_comp[1]
 
           if fingerprint == our_fingerprint:
             self._my_router_status_entry = None
             self._my_router_status_entry_time = 0
 
-          writer.record_relay(fingerprint, address, or_port, nickname)
+          record_relay(fingerprint, address, or_port, nickname)
+
+    with self._relays_for_address_lock:
+      self._relays_for_address = {}
 
     stem.util.log.info('Updated consensus cache, took %0.2fs.' % (time.time() - start_time))
 
@@ -905,7 +943,17 @@ class ConsensusTracker(object):
       if fingerprint and ports:
         return dict([(port, fingerprint) for port in ports])
 
-    return nyx.cache().relays_for_address(address)
+    with self._relays_for_address_lock:
+      relays = self._relays_for_address.get(address)
+
+      if relays is None:
+        if len(self._relays_for_address) >= RELAY_CACHE_SIZE:
+          self._relays_for_address = {}
+
+        relays = nyx.cache().relays_for_address(address)
+        self._relays_for_address[address] = relays
+
+      return relays
 
   def get_relay_address(self, fingerprint, default):
     """
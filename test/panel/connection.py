@@ -11,9 +11,11 @@ import nyx.panel.connection
 import test
 
 from nyx.tracker import Connection
-from nyx.panel.connection import Category, LineType, Line, Entry
+from nyx.panel.connection import Category, SortAttr, LineType, Line, Entry
 from test import require_curses
 
+from stem.util import connection
+
 try:
   # added in python 3.3
   from unittest.mock import Mock, patch
@@ -121,6 +123,81 @@ def line(entry = MockEntry(), line_type = LineType.CONNECTION, connection = CONN
 
 
 class TestConnectionPanel(unittest.TestCase):
+  @patch('time.time', Mock(side_effect = [100, 200, 300]))
+  def test_entry_cache_reference_order(self):
+    referenced = nyx.panel.connection.ENTRY_CACHE_REFERENCED
+    referenced.clear()
+
+    nyx.panel.connection._mark_referenced('conn1')
+    nyx.panel.connection._mark_referenced('conn2')
+    nyx.panel.connection._mark_referenced('conn1')
+
+    self.assertEqual([('conn2', 200), ('conn1', 300)], list(referenced.items()))
+    referenced.clear()
+
+  def test_address_to_int(self):
+    for address in ('0.0.0.0', '75.119.206.243', '255.255.255.255', '2001:db8::ff00:42:8329'):
+      self.assertEqual(connection.address_to_int(address), nyx.panel.connection._address_to_int(address))
+
+  @patch('nyx.panel.connection._address_to_int')
+  def test_sort_value_is_cached(self, address_to_int_mock):
+    address_to_int_mock.return_value = 1265028851
+
+    entry = nyx.panel.connection.ConnectionEntry(CONNECTION)
+    entry._lines = [line(entry = entry)]
+    entry._type = Category.OUTBOUND
+    entry._is_private_val = False
+
+    self.assertEqual((0, 1265028851 * 65536 + 22), entry.sort_value(SortAttr.IP_ADDRESS))
+    self.assertEqual((0, 1265028851 * 65536 + 22), entry.sort_value(SortAttr.IP_ADDRESS))
+    self.assertEqual(1, address_to_int_mock.call_count)
+
+  def test_sort_missing_values_last(self):
+    public_entry = nyx.panel.connection.ConnectionEntry(CONNECTION)
+    public_entry._lines = [line(entry = public_entry, connection = Connection(TIMESTAMP, False, '127.0.0.1', 3531, '255.255.255.255', 443, 'tcp', False), nickname = 'zzzzzzzzzzzzzzzzzzzzzzzz')]
+    public_entry._type = Category.OUTBOUND
+    public_entry._is_private_val = False
+
+    private_entry = nyx.panel.connection.ConnectionEntry(CONNECTION)
+    private_entry._lines = [line(entry = private_entry, fingerprint = None, nickname = None, locale = None)]
+    private_entry._type = Category.INBOUND
+    private_entry._is_private_val = True
+
+    for attr in (SortAttr.IP_ADDRESS, SortAttr.FINGERPRINT, SortAttr.NICKNAME, SortAttr.COUNTRY):
+      self.assertEqual([public_entry, private_entry], nyx.panel.connection._sort_entries([private_entry, public_entry], [attr]))
+
+  @patch('nyx.panel.connection.tor_controller')
+  @patch('nyx.tracker.get_consensus_tracker')
+  def test_connection_type(self, consensus_tracker_mock, tor_controller_mock):
+    tor_controller_mock().get_ports.return_value = []
+    tor_controller_mock().get_exit_policy.return_value = None
+    consensus_tracker_mock().get_relay_fingerprints.return_value = {22: '1F43EE37A0670301AD9CB555D94AFEC2C89FDE86'}
+
+    self.assertEqual(Category.OUTBOUND, nyx.panel.connection.ConnectionEntry(CONNECTION).get_type())
+
+    with patch('nyx.panel.connection.LAST_RETRIEVED_DIR_FINGERPRINTS', set(['1F43EE37A0670301AD9CB555D94AFEC2C89FDE86'])):
+      self.assertEqual(Category.DIRECTORY, nyx.panel.connection.ConnectionEntry(CONNECTION).get_type())
+
+    with patch('nyx.panel.connection.LAST_RETRIEVED_HS_TARGETS', set([('75.119.206.243', 22)])):
+      self.assertEqual(Category.HIDDEN, nyx.panel.connection.ConnectionEntry(CONNECTION).get_type())
+
+  @patch('nyx.panel.connection.tor_controller')
+  @patch('nyx.tracker.get_consensus_tracker')
+  @patch('nyx.panel.connection.LAST_RETRIEVED_HS_TARGETS', set([('127.0.0.1', 80)]))
+  def test_exit_to_hidden_service_port(self, consensus_tracker_mock, tor_controller_mock):
+    tor_controller_mock().get_ports.return_value = []
+    tor_controller_mock().get_exit_policy.return_value = stem.exit_policy.ExitPolicy('accept *:80', 'reject *:*')
+    consensus_tracker_mock().get_relay_fingerprints.return_value = {}
+
+    hidden_entry = nyx.panel.connection.ConnectionEntry(Connection(TIMESTAMP, False, '127.0.0.1', 3531, '127.0.0.1', 80, 'tcp', False))
+    self.assertEqual(Category.HIDDEN, hidden_entry.get_type())
+
+    # exits to another address on our hidden service's port are still exits
+
+    exit_entry = nyx.panel.connection.ConnectionEntry(Connection(TIMESTAMP, False, '127.0.0.1', 3531, '93.184.216.34', 80, 'tcp', False))
+    self.assertEqual(Category.EXIT, exit_entry.get_type())
+    self.assertTrue(exit_entry.is_private())
+
   @require_curses
   def test_draw_title(self):
     rendered = test.render(nyx.panel.connection._draw_title, [], True)
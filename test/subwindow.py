@@ -241,3 +241,16 @@ class TestCurses(unittest.TestCase):
 
     self.assertEqual(None, backlog._handler(no_op_handler, textbox, curses.KEY_DOWN))
     self.assertEqual(call(0, 0, 'hello'), textbox.win.addstr.call_args)
+
+  def test_cursor_scroller_tracks_selection(self):
+    scroller = nyx.curses.CursorScroller()
+    self.assertEqual(('a', 0), scroller.selection(['a', 'b', 'c'], 2))
+
+    scroller.handle_key(nyx.curses.KeyInput(curses.KEY_DOWN), ['a', 'b', 'c'], 2)
+    self.assertEqual(('b', 0), scroller.selection(['a', 'b', 'c'], 2))
+
+    # selection moves with its content, and falls back to its last position
+    # when removed
+
+    self.assertEqual(('b', 2), scroller.selection(['z', 'y', 'a', 'b', 'c'], 2))
+    self.assertEqual(('a', 1), scroller.selection(['c', 'a'], 2))
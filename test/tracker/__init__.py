@@ -4,6 +4,7 @@ Unit tests for nyx's tracker utilities.
 
 __all__ = [
   'connection_tracker',
+  'consensus_tracker',
   'daemon',
   'port_usage_tracker',
   'resource_tracker',
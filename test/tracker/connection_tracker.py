@@ -1,3 +1,4 @@
+import os
 import time
 import unittest
 
@@ -44,6 +45,32 @@ class TestConnectionTracker(unittest.TestCase):
       self.assertEqual(2, daemon.run_counter())
       self.assertEqual([], connections)
 
+  @patch('nyx.tracker.tor_controller')
+  @patch('nyx.tracker.os.access')
+  @patch('nyx.tracker.system', Mock(return_value = Mock()))
+  @patch('stem.util.proc.is_available', Mock(return_value = True))
+  @patch('nyx.tracker.connection.system_resolvers', Mock(return_value = [connection.Resolver.PROC, connection.Resolver.NETSTAT]))
+  def test_prefers_proc_resolver(self, access_mock, tor_controller_mock):
+    tor_controller_mock().get_pid.return_value = 12345
+    tor_controller_mock().get_conf.return_value = '0'
+    access_mock.return_value = True
+
+    daemon = ConnectionTracker(0.04)
+    self.assertEqual([connection.Resolver.PROC, 'by inference', connection.Resolver.NETSTAT], daemon._resolvers)
+    access_mock.assert_called_with('/proc/12345/fd', os.R_OK)
+
+    # when tor's file descriptors are unreadable proc stays behind inference
+
+    access_mock.return_value = False
+
+    daemon = ConnectionTracker(0.04)
+    self.assertEqual(['by inference', connection.Resolver.PROC, connection.Resolver.NETSTAT], daemon._resolvers)
+
+    tor_controller_mock().get_conf.return_value = '1'
+
+    daemon = ConnectionTracker(0.04)
+    self.assertEqual(['by inference'], daemon._resolvers)
+
   @patch('nyx.tracker.tor_controller')
   @patch('nyx.tracker.connection.get_connections')
   @patch('nyx.tracker.system', Mock(return_value = Mock()))
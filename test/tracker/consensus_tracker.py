@@ -0,0 +1,31 @@
+import unittest
+
+from nyx.tracker import ConsensusTracker
+
+try:
+  # added in python 3.3
+  from unittest.mock import patch
+except ImportError:
+  from mock import patch
+
+
+class TestConsensusTracker(unittest.TestCase):
+  @patch('nyx.tracker.tor_controller')
+  @patch('nyx.cache')
+  def test_relay_fingerprints_are_cached(self, cache_mock, tor_controller_mock):
+    tor_controller_mock().get_info.return_value = None
+    cache_mock().relays_updated_at.return_value = 0
+    cache_mock().relays_for_address.return_value = {9001: '1F43EE37A0670301AD9CB555D94AFEC2C89FDE86'}
+
+    tracker = ConsensusTracker()
+    cache_mock().relays_for_address.reset_mock()
+
+    self.assertEqual({9001: '1F43EE37A0670301AD9CB555D94AFEC2C89FDE86'}, tracker.get_relay_fingerprints('75.119.206.243'))
+    self.assertEqual({9001: '1F43EE37A0670301AD9CB555D94AFEC2C89FDE86'}, tracker.get_relay_fingerprints('75.119.206.243'))
+    self.assertEqual(1, cache_mock().relays_for_address.call_count)
+
+    # a new consensus invalidates what we've looked up
+
+    tracker._update('')
+    tracker.get_relay_fingerprints('75.119.206.243')
+    self.assertEqual(2, cache_mock().relays_for_address.call_count)
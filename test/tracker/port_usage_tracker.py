@@ -17,6 +17,12 @@ python  2462 atagar    3u  IPv4  14047      0t0  TCP localhost:37277->localhost:
 python  3444 atagar    3u  IPv4  22023      0t0  TCP localhost:51849->localhost:9051 (ESTABLISHED)
 """
 
+LSOF_IPV6_OUTPUT = """\
+COMMAND  PID   USER   FD   TYPE DEVICE SIZE/OFF NODE NAME
+tor     2001 atagar   14u  IPv6  14048      0t0  TCP [::1]:9051->[::1]:37277 (ESTABLISHED)
+python  2462 atagar    3u  IPv6  14047      0t0  TCP [::1]:37277->[::1]:9051 (ESTABLISHED)
+"""
+
 BAD_LSOF_OUTPUT_NO_ENTRY = """\
 COMMAND  PID   USER   FD   TYPE DEVICE SIZE/OFF NODE NAME
 """
@@ -56,6 +62,11 @@ class TestPortUsageTracker(unittest.TestCase):
 
     self.assertEqual({37277: Process(2462, 'python'), 51849: Process(2001, 'tor')}, _process_for_ports([37277], [51849]))
 
+  @patch('nyx.tracker.system.call', Mock(return_value = LSOF_IPV6_OUTPUT.split('\n')))
+  def test_process_for_ports_ipv6(self):
+    self.assertEqual({9051: Process(2001, 'tor')}, _process_for_ports([9051], []))
+    self.assertEqual({37277: Process(2462, 'python')}, _process_for_ports([37277], []))
+
   @patch('nyx.tracker.system.call')
   def test_process_for_ports_malformed(self, call_mock):
     # Issues that are valid, but should result in us not having any content.